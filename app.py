@@ -1,13 +1,19 @@
 # app.py
 import streamlit as st
-import json
+import orjson
 import bcrypt
 import os
+import bisect
+import hashlib
+import re
+import shutil
+import tempfile
 from PIL import Image
 from base64 import b64encode
-from datetime import datetime, date
+from datetime import date
 from typing import Optional, Tuple
-from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import pydeck as pdk
@@ -25,93 +31,163 @@ if not os.path.exists("profile_pics"):
     os.makedirs("profile_pics")
 
 USERS_FILE = "users.json"
-TRIPS_FILE = "trips.json"
+TRIPS_FILE = "trips.json"  # legacy single-file store, split into TRIPS_DIR on first run
+TRIPS_DIR = os.path.join("data", "trips")
+
+# bcrypt cost factor for new hashes, pinned to the library default so an upgrade can't
+# change it; existing hashes keep the cost they were made with
+BCRYPT_ROUNDS = 12
 
 # ---------------------- Persistence Helpers ----------------------
+def _mtime(path) -> Optional[float]:
+    # One stat call instead of exists() + getmtime(); None when the file is missing
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def _load_json(path):
+    # orjson parses bytes directly, so skip the text-mode decode to str
+    with open(path, "rb") as f:
+        try:
+            return orjson.loads(f.read())
+        except orjson.JSONDecodeError:
+            return {}
+
+@st.cache_data(show_spinner=False)
+def _load_users_cached(path: str, mtime: float):
+    data = _load_json(path)
+    for user in list(data.keys()):
+        if isinstance(data[user], str):
+            data[user] = {
+                "password": data[user],
+                "profile_pic": None,
+                "role": "user",
+                "bio": "",
+                "favorite_destination": "",
+                "goals": ""
+            }
+        data[user].setdefault("role", "user")
+        data[user].setdefault("profile_pic", None)
+        data[user].setdefault("bio", "")
+        data[user].setdefault("favorite_destination", "")
+        data[user].setdefault("goals", "")
+    return data
+
 def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            try:
-                data = json.load(f)
-                for user in list(data.keys()):
-                    if isinstance(data[user], str):
-                        data[user] = {
-                            "password": data[user],
-                            "profile_pic": None,
-                            "role": "user",
-                            "bio": "",
-                            "favorite_destination": "",
-                            "goals": ""
-                        }
-                    data[user].setdefault("role", "user")
-                    data[user].setdefault("profile_pic", None)
-                    data[user].setdefault("bio", "")
-                    data[user].setdefault("favorite_destination", "")
-                    data[user].setdefault("goals", "")
-                return data
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    # mtime is part of the cache key, so an edited file is re-read automatically
+    mtime = _mtime(USERS_FILE)
+    return _load_users_cached(USERS_FILE, mtime) if mtime is not None else {}
+
+def _write_json_atomic(path, data):
+    # Write to a unique sibling temp file and swap it in, so readers never see a
+    # half-written file and two sessions saving at once never share a temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, dict):
+                # Keyed stores (users.json) grow with every account: serialise one entry at a
+                # time so peak memory is a single record, not the whole file as one bytes object
+                f.write(b"{")
+                for n, (key, value) in enumerate(data.items()):
+                    if n:
+                        f.write(b",")
+                    f.write(orjson.dumps(key))
+                    f.write(b":")
+                    f.write(orjson.dumps(value))
+                f.write(b"}\n")
+            else:
+                f.write(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
 
 def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
-
-def load_trips():
-    if os.path.exists(TRIPS_FILE):
-        with open(TRIPS_FILE, "r") as f:
-            try:
-                data = json.load(f)
-                for uname, trs in list(data.items()):
-                    new_trs = []
-                    for t in trs:
-                        t.setdefault("destination", "")
-                        t.setdefault("start_date", "")
-                        t.setdefault("end_date", "")
-                        t.setdefault("notes", "")
-                        t.setdefault("expenses", [])
-                        t.setdefault("checklist", [])
-                        t.setdefault("lat", None)
-                        t.setdefault("lon", None)
-                        new_trs.append(t)
-                    data[uname] = new_trs
-                return data
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-def save_trips(trips):
-    with open(TRIPS_FILE, "w") as f:
-        json.dump(trips, f, indent=2)
+    _write_json_atomic(USERS_FILE, users)
+    _load_users_cached.clear()
+
+def _user_trips_path(username: str) -> str:
+    # One file per user so an edit only rewrites that user's trips. The name is a hash
+    # of the username: always a valid, fixed-length file name, and distinct for
+    # usernames that differ only in case (which share a file on Windows and macOS)
+    return os.path.join(TRIPS_DIR, hashlib.sha256(username.encode()).hexdigest() + ".json")
+
+def _normalize_trips(trs):
+    for t in trs:
+        t.setdefault("destination", "")
+        t.setdefault("start_date", "")
+        t.setdefault("end_date", "")
+        t.setdefault("notes", "")
+        t.setdefault("expenses", [])
+        t.setdefault("checklist", [])
+        t.setdefault("lat", None)
+        t.setdefault("lon", None)
+    return trs
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _load_user_trips_cached(path: str, mtime: float):
+    # Keyed on the shard's mtime, so a write only invalidates that one user's entry
+    data = _load_json(path)
+    return _normalize_trips(data) if isinstance(data, list) else []
+
+def load_user_trips(username: str):
+    path = _user_trips_path(username)
+    mtime = _mtime(path)
+    return _load_user_trips_cached(path, mtime) if mtime is not None else []
+
+def get_user_trips(username: str):
+    # The session keeps its own list between reruns and reloads it only when the
+    # user's shard changes on disk (an edit saved here, or one from another session)
+    key = (username, _mtime(_user_trips_path(username)))
+    if st.session_state.get("_user_trips_key") != key:
+        st.session_state["user_trips"] = load_user_trips(username)
+        st.session_state["_user_trips_key"] = key
+    return st.session_state["user_trips"]
+
+def save_user_trips(username: str, user_trips):
+    _write_json_atomic(_user_trips_path(username), user_trips)
+
+def _migrate_trips_file():
+    # Split the legacy trips.json into per-user files the first time we run.
+    # Shards go to a private temp dir that is renamed into place, so neither a crash
+    # nor two sessions migrating at once can leave a partial store behind.
+    if os.path.isdir(TRIPS_DIR):
+        return
+    legacy = _load_json(TRIPS_FILE) if os.path.exists(TRIPS_FILE) else {}
+    parent = os.path.dirname(TRIPS_DIR)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix="trips.", dir=parent)
+    try:
+        for uname, trs in legacy.items():
+            _write_json_atomic(os.path.join(tmp_dir, os.path.basename(_user_trips_path(uname))), trs)
+        os.rename(tmp_dir, TRIPS_DIR)
+    except OSError:
+        # Another session finished the migration first; its copy is just as good
+        if not os.path.isdir(TRIPS_DIR):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
 def check_password(password, hashed):
     return bcrypt.checkpw(password.encode(), hashed.encode())
 
 # ---------------------- Badges ----------------------
+_TIER_NAMES = ["New Traveler", "Explorer", "Adventurer", "Globetrotter", "World Citizen"]
+_TIER_THRESHOLDS = [0, 1, 3, 6, 10]
+
 def get_user_badge(trip_count: int) -> Tuple[str, int, Optional[int]]:
-    tiers = [
-        ("New Traveler", 0),
-        ("Explorer", 1),
-        ("Adventurer", 3),
-        ("Globetrotter", 6),
-        ("World Citizen", 10),
-    ]
-    current_badge = tiers[0][0]
-    level_index = 0
-    next_threshold = tiers[1][1]
-
-    for i in range(len(tiers)):
-        name, threshold = tiers[i]
-        if trip_count >= threshold:
-            current_badge = name
-            level_index = i
-            next_threshold = tiers[i + 1][1] if i + 1 < len(tiers) else None
-        else:
-            break
-    return current_badge, level_index, next_threshold
+    level_index = max(0, bisect.bisect_right(_TIER_THRESHOLDS, trip_count) - 1)
+    next_threshold = _TIER_THRESHOLDS[level_index + 1] if level_index + 1 < len(_TIER_THRESHOLDS) else None
+    return _TIER_NAMES[level_index], level_index, next_threshold
 
 # ---------------------- Styling ----------------------
 def add_custom_css(dark_mode):
@@ -181,11 +257,28 @@ def add_custom_css(dark_mode):
 
 
 # ---------------------- Helpers ----------------------
+PROFILE_PIC_SIZE = (200, 200)
+_IMAGE_MIME = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+def save_profile_pic(upload, username: str) -> str:
+    # Avatars are shown at 90px, so store a small WebP thumbnail, not the upload
+    img = Image.open(upload)
+    img.thumbnail(PROFILE_PIC_SIZE, Image.LANCZOS)
+    has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+    img_filename = f"profile_pics/{username}.webp"
+    img.convert("RGBA" if has_alpha else "RGB").save(img_filename, "WEBP", quality=82, method=4)
+    return img_filename
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _img_data_uri(path: str, mtime: float) -> str:
+    mime = _IMAGE_MIME.get(os.path.splitext(path)[1].lower(), "image/png")
+    with open(path, "rb") as img_file:
+        return f"data:{mime};base64,{b64encode(img_file.read()).decode()}"
+
 def display_profile_card(username, profile_img_path, badge_name="Traveler"):
-    if profile_img_path and os.path.exists(profile_img_path):
-        with open(profile_img_path, "rb") as img_file:
-            img_base64 = b64encode(img_file.read()).decode()
-        img_src = f"data:image/png;base64,{img_base64}"
+    img_mtime = _mtime(profile_img_path) if profile_img_path else None
+    if img_mtime is not None:
+        img_src = _img_data_uri(profile_img_path, img_mtime)
     else:
         img_src = f"https://i.pravatar.cc/100?u={username}"
 
@@ -197,6 +290,27 @@ def display_profile_card(username, profile_img_path, badge_name="Traveler"):
     </div>
     """, unsafe_allow_html=True)
 
+# Figures are cached on the aggregated frames (hashed by Streamlit), so revisiting
+# Insights without new expenses reuses the previously built Plotly figures.
+@st.cache_data(max_entries=32, show_spinner=False)
+def _expenses_bar_fig(per_trip: pd.DataFrame):
+    return px.bar(
+        per_trip, x="destination", y="amount",
+        labels={"amount":"Total Amount (USD)","destination":"Trip"},
+        title="Expenses per Trip"
+    )
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _expenses_line_fig(daily: pd.DataFrame):
+    return px.line(daily, x="date", y="cumulative", markers=True, title="Cumulative Expenses Over Time")
+
+@contextmanager
+def tv_card():
+    # One bordered container per card, instead of two raw-HTML markdown elements
+    # around the content (which Streamlit renders as separate, empty divs anyway)
+    with st.container(border=True):
+        yield
+
 def stat_card(title: str, value: str, emoji: str = "📌"):
     st.markdown(f"""
     <div class="tv-card">
@@ -216,32 +330,75 @@ def hero(title: str, subtitle: str):
     </div>
     """, unsafe_allow_html=True)
 
+CHATBOT_RESPONSES = {
+    "hello": "Hello! Welcome to TravelViz. How can I help you today?",
+    "what is travelviz": "TravelViz is your travel insights dashboard — track destinations, explore data, and plan trips!",
+    "features": "We have login/signup, dashboard, insights, trip planner, interactive map, profile management, and an admin panel.",
+    "bye": "Safe travels! 🌍✈",
+}
+_CHATBOT_PATTERN = re.compile("|".join(map(re.escape, CHATBOT_RESPONSES)))
+
 def chatbot_response(user_input):
-    responses = {
-        "hello": "Hello! Welcome to TravelViz. How can I help you today?",
-        "what is travelviz": "TravelViz is your travel insights dashboard — track destinations, explore data, and plan trips!",
-        "features": "We have login/signup, dashboard, insights, trip planner, interactive map, profile management, and an admin panel.",
-        "bye": "Safe travels! 🌍✈",
-    }
-    for key in responses:
-        if key in user_input.lower():
-            return responses[key]
+    m = _CHATBOT_PATTERN.search(user_input.lower())
+    if m:
+        return CHATBOT_RESPONSES[m.group(0)]
     return "I'm not sure about that, but I can tell you more about TravelViz!"
 
 def parse_date_str(s: str) -> Optional[date]:
     try:
-        return datetime.strptime(s, "%Y-%m-%d").date()
+        return date.fromisoformat(s)
     except Exception:
         return None
 
-def trigger_reminders(username: str, trips_dict: dict):
-    today = date.today()
-    for t in trips_dict.get(username, []):
-        d = parse_date_str(t.get("start_date", ""))
-        if d is None: continue
-        days_left = (d - today).days
-        if 0 <= days_left <= 3:
-            st.toast(f"⏰ Reminder: Your trip to {t.get('destination','(unknown)')} starts in {days_left} day(s)!")
+TRIP_COLUMNS = ["destination", "start_date", "end_date", "notes", "expenses", "checklist", "lat", "lon"]
+
+def trips_frame(user_trips) -> pd.DataFrame:
+    # Column-wise view of a user's trips; "start" is start_date parsed once
+    df = pd.DataFrame(user_trips, columns=TRIP_COLUMNS)
+    df["start"] = pd.to_datetime(df["start_date"], format="%Y-%m-%d", errors="coerce")
+    return df
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _user_stats(username: str, mtime: float, today: date) -> dict:
+    df = trips_frame(load_user_trips(username))
+    dest_counts = df["destination"].str.strip().value_counts()
+    return {
+        "total": len(df),
+        "upcoming": int((df["start"] >= pd.Timestamp(today)).sum()),
+        "most_visited": dest_counts.index[0] if not dest_counts.empty else "—",
+    }
+
+def user_stats(username: str) -> dict:
+    # Recomputed only when the user's trips file changes (or the day rolls over)
+    return _user_stats(username, _mtime(_user_trips_path(username)), date.today())
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _trips_table(username: str, trip_count: int, mtime: float, _user_trips) -> pd.DataFrame:
+    # _user_trips is left out of the cache key; username/count/mtime identify it
+    return pd.DataFrame({
+        "Destination": [t["destination"] for t in _user_trips],
+        "Start Date": [t["start_date"] for t in _user_trips],
+        "End Date": [t["end_date"] for t in _user_trips],
+        "Notes": [t["notes"] for t in _user_trips],
+    })
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _admin_table(users_mtime: float, trips_mtime: float) -> pd.DataFrame:
+    # Keyed on users.json and the trips directory: writing a shard goes through a
+    # rename inside TRIPS_DIR, which bumps the directory's mtime
+    users = load_users()
+    return pd.DataFrame({
+        "User": list(users),
+        "Role": [info.get("role") for info in users.values()],
+        "Trips": [len(load_user_trips(u)) for u in users],
+    })
+
+def trigger_reminders(user_trips):
+    df = trips_frame(user_trips)
+    days_left = (df["start"] - pd.Timestamp(date.today())).dt.days
+    due = days_left.between(0, 3)
+    for dest, days in zip(df.loc[due, "destination"], days_left[due]):
+        st.toast(f"⏰ Reminder: Your trip to {dest or '(unknown)'} starts in {int(days)} day(s)!")
 
 # ---------------------- Minimal fallback coords ----------------------
 FALLBACK_CENTROIDS = {
@@ -252,12 +409,183 @@ FALLBACK_CENTROIDS = {
     "japan": (36.20, 138.25),
     "tokyo": (35.67, 139.65),
 }
+# All keys in one alternation, so a lookup is a single scan of the name. The script
+# rebuilds this on every rerun, but re caches compiled patterns, so only the first
+# run pays for compiling it
+_FALLBACK_PATTERN = re.compile("|".join(map(re.escape, FALLBACK_CENTROIDS)))
+
 def fallback_coords_for_destination(dest: str):
     key = dest.strip().lower()
-    for k, v in FALLBACK_CENTROIDS.items():
-        if k in key:
-            return v
-    return None
+    # Most destinations are just a city/country name, which is a single hashed lookup
+    hit = FALLBACK_CENTROIDS.get(key)
+    if hit is not None:
+        return hit
+    m = _FALLBACK_PATTERN.search(key)
+    return FALLBACK_CENTROIDS[m.group(0)] if m else None
+
+def build_map_df(user_trips) -> pd.DataFrame:
+    df = pd.DataFrame(user_trips, columns=["destination", "start_date", "lat", "lon"])
+    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
+    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
+    missing = df["lat"].isna() | df["lon"].isna()
+    if missing.any():
+        # Resolve each distinct destination once, then map the results back onto the rows
+        dests = df.loc[missing, "destination"]
+        lookup = {d: fallback_coords_for_destination(d) for d in dests.unique()}
+        hits = dests.map(lookup).dropna()
+        fallback = pd.DataFrame(hits.tolist(), index=hits.index, columns=["lat", "lon"])
+        df.loc[fallback.index, ["lat", "lon"]] = fallback
+    return df.dropna(subset=["lat", "lon"])
+
+def _centroid(lats: np.ndarray, lons: np.ndarray) -> Tuple[float, float]:
+    return float(lats.mean()), float(lons.mean())
+
+# Above this many pins, points are binned into hexagons on the client instead of drawn one by one
+MAP_AGGREGATE_THRESHOLD = 500
+
+def build_deck(map_df: pd.DataFrame, fill_color) -> pdk.Deck:
+    # The layer data is serialised to JSON on every render: send only the columns the
+    # layer and tooltip use, with coordinates rounded to ~10 m to keep the payload short
+    data = map_df[["destination", "start_date", "lon", "lat"]].round({"lon": 4, "lat": 4})
+    if len(data) > MAP_AGGREGATE_THRESHOLD:
+        layer = pdk.Layer(
+            "HexagonLayer",
+            data=data,
+            get_position=["lon", "lat"],
+            radius=50000,
+            elevation_scale=0,
+            extruded=False,
+            pickable=True
+        )
+        tooltip = {"text": "{elevationValue} trip(s)"}
+    else:
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=data,
+            get_position=["lon", "lat"],
+            get_fill_color=fill_color,
+            get_radius=50000,
+            radius_scale=20,
+            pickable=True
+        )
+        tooltip = {"text": "{destination}\n{start_date}"}
+    center_lat, center_lon = _centroid(map_df["lat"].to_numpy(), map_df["lon"].to_numpy())
+    view_state = pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=1.5, pitch=0)
+    return pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
+
+def cached_deck(map_df: pd.DataFrame, fill_color) -> pdk.Deck:
+    # Keep the last Deck per map in the session and rebuild it only when the pins change
+    data_key = int(pd.util.hash_pandas_object(map_df, index=False).sum())
+    decks = st.session_state.setdefault("_decks", {})
+    entry = decks.get(tuple(fill_color))
+    if entry is None or entry[0] != data_key:
+        entry = (data_key, build_deck(map_df, fill_color))
+        decks[tuple(fill_color)] = entry
+    return entry[1]
+
+# ---------------------- Trip Planner widgets ----------------------
+EXPENSE_CATEGORIES = ["Flights", "Hotels", "Food", "Activities", "Misc"]
+
+@st.fragment
+def render_trip(username, user_trips, i):
+    # Each trip is its own fragment: checklist and expense edits rerun only this
+    # block, not the whole page
+    trip = user_trips[i]
+    st.markdown("---")
+    top1, top2, top3 = st.columns([5,2,1])
+    with top1:
+        st.markdown(f"### ✈ {trip['destination']}  \n`{trip['start_date']} → {trip['end_date']}`")
+    with top2:
+        d = parse_date_str(trip.get("start_date",""))
+        if d:
+            days_left = (d - date.today()).days
+            if days_left >= 0:
+                st.caption(f"⏳ Starts in *{days_left}* day(s)")
+            else:
+                st.caption("✅ Trip started/finished")
+    with top3:
+        if st.button("🗑 Delete Trip", key=f"del_trip_{i}"):
+            user_trips.pop(i)
+            save_user_trips(username, user_trips)
+            st.rerun()  # the trip list itself changed, so redraw the whole page
+
+    # Checklist
+    with st.expander(f"✅ Travel Checklist — {trip['destination']}"):
+        ci1, ci2 = st.columns([4,1])
+        with ci1:
+            new_item_text = st.text_input("Add checklist item", key=f"chk_add_{i}")
+        with ci2:
+            if st.button("Add", key=f"chk_btn_{i}"):
+                if new_item_text.strip():
+                    trip["checklist"].append({"text": new_item_text.strip(), "done": False})
+                    save_user_trips(username, user_trips)
+                    st.rerun(scope="fragment")
+                else:
+                    st.warning("Please type an item first.")
+
+        if trip["checklist"]:
+            for j, item in enumerate(trip["checklist"]):
+                colX, colY, colZ = st.columns([6, 2, 1])
+                with colX:
+                    new_done = st.checkbox(item["text"], value=item.get("done", False), key=f"chk_item_{i}_{j}")
+                    if new_done != item.get("done", False):
+                        item["done"] = new_done
+                        save_user_trips(username, user_trips)
+                with colY:
+                    edited = st.text_input("Update item text", value=item["text"], key=f"edit_text_{i}_{j}")
+                    if st.button("Save", key=f"save_text_{i}_{j}"):
+                        item["text"] = edited.strip() or item["text"]
+                        save_user_trips(username, user_trips)
+                        st.success("Item updated.")
+                        st.rerun(scope="fragment")
+                with colZ:
+                    if st.button("🗑", key=f"del_chk_{i}_{j}"):
+                        trip["checklist"].pop(j)
+                        save_user_trips(username, user_trips)
+                        st.rerun(scope="fragment")
+        else:
+            st.info("No checklist items yet. Add one above.")
+
+    # Expenses management
+    with st.expander(f"💰 Manage Expenses — {trip['destination']}"):
+        category = st.selectbox("Category", EXPENSE_CATEGORIES, key=f"cat_{i}")
+        desc = st.text_input("Description", key=f"desc_{i}")
+        amount = st.number_input("Amount", min_value=0.0, step=0.01, key=f"amt_{i}")
+        if st.button("Add Expense", key=f"add_exp_{i}"):
+            if desc and amount > 0:
+                trip["expenses"].append({
+                    "category": category,
+                    "description": desc,
+                    "amount": amount
+                })
+                save_user_trips(username, user_trips)
+                st.rerun(scope="fragment")
+            else:
+                st.warning("Enter a description and amount.")
+
+        if trip["expenses"]:
+            # One editable grid per trip instead of a row of widgets per expense;
+            # edits and deletions are applied together when the user saves
+            editor_key = f"exp_editor_{i}"
+            exp_df = pd.DataFrame(trip["expenses"], columns=["category", "description", "amount"])
+            edited = st.data_editor(
+                exp_df,
+                num_rows="dynamic",
+                use_container_width=True,
+                key=editor_key,
+                column_config={
+                    "category": st.column_config.SelectboxColumn("Category", options=EXPENSE_CATEGORIES, required=True),
+                    "description": st.column_config.TextColumn("Description", required=True),
+                    "amount": st.column_config.NumberColumn("Amount", min_value=0.0, step=0.01, format="$%.2f", required=True),
+                },
+            )
+            if st.button("💾 Save Expenses", key=f"save_exps_{i}"):
+                if not edited.equals(exp_df):
+                    trip["expenses"] = edited.dropna(subset=["category", "description", "amount"]).to_dict("records")
+                    save_user_trips(username, user_trips)
+                # Drop the editor's pending edits so they aren't replayed onto the saved rows
+                st.session_state.pop(editor_key, None)
+                st.rerun(scope="fragment")
 
 # ---------------------- Session ----------------------
 if "logged_in" not in st.session_state:
@@ -266,8 +594,9 @@ if "logged_in" not in st.session_state:
     st.session_state.role = "user"
     st.session_state.dark_mode = False
 
+_migrate_trips_file()
+
 users = load_users()
-trips = load_trips()
 
 # ---------------------- Sidebar ----------------------
 with st.sidebar:
@@ -306,18 +635,17 @@ add_custom_css(st.session_state.dark_mode)
 
 
 # ---------------------- SIGN UP ----------------------
-if not st.session_state.logged_in and menu == "Sign Up":
+def render_sign_up():
     hero("Create your TravelViz account", "Join and start building your travel story.")
     st.markdown("")
 
     with st.container():
         col_a, col_b = st.columns([2, 1])
         with col_a:
-            st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-            new_user = st.text_input("Username", key="signup_user")
-            new_pass = st.text_input("Password", type='password', key="signup_pass")
-            profile_image = st.file_uploader("Upload Profile Picture", type=["png", "jpg", "jpeg"])
-            st.markdown('</div>', unsafe_allow_html=True)
+            with tv_card():
+                new_user = st.text_input("Username", key="signup_user")
+                new_pass = st.text_input("Password", type='password', key="signup_pass")
+                profile_image = st.file_uploader("Upload Profile Picture", type=["png", "jpg", "jpeg"])
             if st.button("Sign Up"):
                 if new_user in users:
                     st.warning("Username already exists.")
@@ -326,8 +654,7 @@ if not st.session_state.logged_in and menu == "Sign Up":
                 else:
                     img_filename = None
                     if profile_image:
-                        img_filename = f"profile_pics/{new_user}.png"
-                        Image.open(profile_image).save(img_filename)
+                        img_filename = save_profile_pic(profile_image, new_user)
                     users[new_user] = {
                         "password": hash_password(new_pass),
                         "profile_pic": img_filename,
@@ -340,41 +667,42 @@ if not st.session_state.logged_in and menu == "Sign Up":
                     st.success("Account created successfully! You can now login.")
                     st.balloons()
         with col_b:
-            st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-            st.markdown("*Why TravelViz?*")
-            st.markdown("- Plan trips with checklists")
-            st.markdown("- Track expenses easily")
-            st.markdown("- Visualize your journeys on a map")
-            st.markdown("- Earn badges as you explore")
-            st.markdown('</div>', unsafe_allow_html=True)
+            with tv_card():
+                st.markdown(
+                    "*Why TravelViz?*\n\n"
+                    "- Plan trips with checklists\n"
+                    "- Track expenses easily\n"
+                    "- Visualize your journeys on a map\n"
+                    "- Earn badges as you explore"
+                )
 
 # ---------------------- LOGIN ----------------------
-elif not st.session_state.logged_in and menu == "Login":
+def render_login():
     hero("Welcome back 👋", "Log in to continue your adventures.")
     st.markdown("")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    username = st.text_input("Username", key="login_user")
-    password = st.text_input("Password", type='password', key="login_pass")
-    st.markdown('</div>', unsafe_allow_html=True)
+    with tv_card():
+        username = st.text_input("Username", key="login_user")
+        password = st.text_input("Password", type='password', key="login_pass")
 
     if st.button("Login"):
-        if username in users and check_password(password, users[username]['password']):
+        u = users.get(username)
+        if u and check_password(password, u['password']):
             st.session_state.logged_in = True
             st.session_state.username = username
-            st.session_state.role = users[username].get("role", "user")
+            st.session_state.role = u.get("role", "user")
             st.success(f"Welcome, {username} 👋")
-            trigger_reminders(username, trips)
+            trigger_reminders(get_user_trips(username))
             st.balloons()
             st.rerun()
         else:
             st.error("Invalid credentials.")
 
 # ---------------------- HOME ----------------------
-elif st.session_state.logged_in and menu == "Home":
+def render_home():
     username = st.session_state.username
     profile_img_path = users[username].get('profile_pic')
 
-    user_trips = trips.get(username, [])
+    user_trips = get_user_trips(username)
     badge_name, _, next_threshold = get_user_badge(len(user_trips))
 
     display_profile_card(username, profile_img_path, badge_name)
@@ -383,14 +711,9 @@ elif st.session_state.logged_in and menu == "Home":
     hero("🌍 TravelViz", "Track destinations • Explore data • Plan smarter journeys")
 
     # Quick stats
-    upcoming_count = 0
-    today = date.today()
-    for t in user_trips:
-        d = parse_date_str(t.get("start_date", ""))
-        if d and d >= today:
-            upcoming_count += 1
-
-    total_trips = len(user_trips)
+    stats = user_stats(username)
+    upcoming_count = stats["upcoming"]
+    total_trips = stats["total"]
     remaining = max(0, (next_threshold - total_trips) if next_threshold is not None else 0)
 
     col1, col2, col3 = st.columns(3)
@@ -401,76 +724,65 @@ elif st.session_state.logged_in and menu == "Home":
     with col3:
         stat_card("Next Badge Progress", f"{'Maxed 🎉' if next_threshold is None else f'{remaining} to go'}", "🏅")
 
-    trigger_reminders(username, trips)
+    trigger_reminders(user_trips)
 
     # Profile summary
     u = users.get(username, {})
     st.markdown("")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    st.subheader("👤 Your Profile")
-    colA, colB = st.columns(2)
-    with colA:
-        st.markdown(f"*Badge:* :medal: {badge_name}")
-        st.markdown(f"*Trips Logged:* {len(user_trips)}")
-        if next_threshold is not None:
-            st.markdown(f"*Next Badge In:* {remaining} trip(s)")
-        else:
-            st.markdown("*Badge Status:* World Citizen 🎉")
-    with colB:
-        st.markdown(f"*Favorite Destination:* {u.get('favorite_destination','') or '—'}")
-        st.markdown(f"*Bio:* {u.get('bio','') or '—'}")
-        st.markdown(f"*Travel Goals:* {u.get('goals','') or '—'}")
-    st.markdown('</div>', unsafe_allow_html=True)
+    with tv_card():
+        st.subheader("👤 Your Profile")
+        colA, colB = st.columns(2)
+        # One markdown element per column rather than one per line
+        with colA:
+            badge_status = f"*Next Badge In:* {remaining} trip(s)" if next_threshold is not None else "*Badge Status:* World Citizen 🎉"
+            st.markdown("\n\n".join([
+                f"*Badge:* :medal: {badge_name}",
+                f"*Trips Logged:* {len(user_trips)}",
+                badge_status,
+            ]))
+        with colB:
+            st.markdown("\n\n".join([
+                f"*Favorite Destination:* {u.get('favorite_destination','') or '—'}",
+                f"*Bio:* {u.get('bio','') or '—'}",
+                f"*Travel Goals:* {u.get('goals','') or '—'}",
+            ]))
 
 # ---------------------- DASHBOARD ----------------------
-elif st.session_state.logged_in and menu == "Dashboard":
+def render_dashboard():
     username = st.session_state.username
     profile_img_path = users[username].get('profile_pic')
 
-    user_trips = trips.get(username, [])
+    user_trips = get_user_trips(username)
     badge_name, _, _ = get_user_badge(len(user_trips))
     display_profile_card(username, profile_img_path, badge_name)
 
     st.header("📊 TravelViz Dashboard")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    st.markdown("""
+    with tv_card():
+        st.markdown("""
     <iframe title="global tourism" width="100%" height="520"
     src="https://app.powerbi.com/view?r=eyJrIjoiZjNmMmViOGUtMDYyNi00NTFkLTkzNTMtN2JkYWQyM2FjN2VkIiwidCI6IjdkOTk1NThlLTFhMjMtNDVlMi04NzNhLTM4ODNjMjc4NjNmOCJ9"
     frameborder="0" allowFullScreen="true"></iframe>
     """, unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
 
 # ---------------------- INSIGHTS ----------------------
-elif st.session_state.logged_in and menu == "Insights":
+def render_insights():
     st.header("📈 Insights & Data")
 
     username = st.session_state.username
-    user_trips = trips.get(username, [])
+    user_trips = get_user_trips(username)
 
     # Summary metrics
-    total_trips = len(user_trips)
-    dest_counts = defaultdict(int)
-    for t in user_trips:
-        dest_counts[t.get("destination","").strip()] += 1
-    most_visited = max(dest_counts.items(), key=lambda x: x[1])[0] if dest_counts else "—"
+    stats = user_stats(username)
+    total_trips = stats["total"]
+    most_visited = stats["most_visited"]
 
-    # Total expenses across all trips
+    # Total expenses across all trips — one flat frame of every expense
+    exp_df = pd.json_normalize(user_trips, record_path="expenses", meta=["destination", "start_date"])
     total_expenses = 0.0
-    expenses_rows = []
-    for t in user_trips:
-        trip_name = t.get("destination","(unknown)")
-        trip_date = parse_date_str(t.get("start_date","")) or date.today()
-        trip_total = 0.0
-        for e in t.get("expenses", []):
-            amt = float(e.get("amount", 0) or 0)
-            trip_total += amt
-            expenses_rows.append({
-                "destination": trip_name,
-                "date": trip_date,
-                "category": e.get("category",""),
-                "amount": amt
-            })
-        total_expenses += trip_total
+    if not exp_df.empty:
+        exp_df["amount"] = pd.to_numeric(exp_df["amount"], errors="coerce").fillna(0)
+        exp_df["date"] = pd.to_datetime(exp_df["start_date"], format="%Y-%m-%d", errors="coerce").dt.date.fillna(date.today())
+        total_expenses = float(exp_df["amount"].sum())
 
     col1, col2, col3 = st.columns(3)
     with col1: stat_card("Total Trips", f"{total_trips}", "🧭")
@@ -480,23 +792,16 @@ elif st.session_state.logged_in and menu == "Insights":
     st.markdown("")
 
     # Expenses over trips (bar chart)
-    if expenses_rows:
+    if not exp_df.empty:
         st.subheader("💸 Expenses per Trip")
-        exp_df = pd.DataFrame(expenses_rows)
         per_trip = exp_df.groupby("destination", as_index=False)["amount"].sum().sort_values("amount", ascending=False)
-        fig_bar = px.bar(
-            per_trip, x="destination", y="amount",
-            labels={"amount":"Total Amount (USD)","destination":"Trip"},
-            title="Expenses per Trip"
-        )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        st.plotly_chart(_expenses_bar_fig(per_trip), use_container_width=True)
 
         # expenses over time (line) — cumulative by date
         st.subheader("📈 Expenses Over Time (Cumulative)")
         daily = exp_df.groupby("date", as_index=False)["amount"].sum().sort_values("date")
         daily["cumulative"] = daily["amount"].cumsum()
-        fig_line = px.line(daily, x="date", y="cumulative", markers=True, title="Cumulative Expenses Over Time")
-        st.plotly_chart(fig_line, use_container_width=True)
+        st.plotly_chart(_expenses_line_fig(daily), use_container_width=True)
     else:
         st.info("No expenses recorded yet. Add expenses in Trip Planner to see charts.")
 
@@ -504,67 +809,36 @@ elif st.session_state.logged_in and menu == "Insights":
 
     # World map of visited destinations (pydeck)
     st.subheader("🗺 Visited Destinations Map")
-    map_rows = []
-    for t in user_trips:
-        dest = t.get("destination","")
-        lat = t.get("lat")
-        lon = t.get("lon")
-        if lat is None or lon is None:
-            coords = fallback_coords_for_destination(dest)
-            if coords:
-                lat, lon = coords
-        try:
-            lat_f = float(lat) if lat is not None else None
-            lon_f = float(lon) if lon is not None else None
-        except Exception:
-            lat_f, lon_f = None, None
-        if lat_f is not None and lon_f is not None:
-            map_rows.append({"destination": dest, "lat": lat_f, "lon": lon_f, "start_date": t.get("start_date","")})
-
-    if map_rows:
-        map_df = pd.DataFrame(map_rows)
-        layer = pdk.Layer(
-            "ScatterplotLayer",
-            data=map_df,
-            get_position=["lon", "lat"],
-            get_fill_color=[255, 140, 0],
-            get_radius=50000,
-            radius_scale=20,
-            pickable=True
-        )
-        center = [map_df["lon"].mean(), map_df["lat"].mean()]
-        view_state = pdk.ViewState(latitude=center[1], longitude=center[0], zoom=1.5, pitch=0)
-        deck = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={"text":"{destination}\n{start_date}"})
-        st.pydeck_chart(deck)
+    map_df = build_map_df(user_trips)
+    if not map_df.empty:
+        st.pydeck_chart(cached_deck(map_df, [255, 140, 0]))
     else:
         st.info("No geocoded trips to show on map. When adding a trip, specify latitude & longitude (optional) or use a recognizable destination name (e.g., 'Paris').")
 
     st.caption("Tip: Add *Latitude* & *Longitude* in Trip Planner for precise map pins.")
 
 # ---------------------- TRIP PLANNER ----------------------
-elif st.session_state.logged_in and menu == "Trip Planner":
+def render_trip_planner():
     username = st.session_state.username
-    user_trips = trips.get(username, [])
+    user_trips = get_user_trips(username)
 
     st.header("🗓 Plan Your Trip")
     with st.container():
         col_left, col_right = st.columns([2,1])
         with col_left:
-            st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-            destination = st.text_input("Destination")
-            start_date = st.date_input("Start Date")
-            end_date = st.date_input("End Date")
-            notes = st.text_area("Notes")
-            st.markdown('</div>', unsafe_allow_html=True)
+            with tv_card():
+                destination = st.text_input("Destination")
+                start_date = st.date_input("Start Date")
+                end_date = st.date_input("End Date")
+                notes = st.text_area("Notes")
         with col_right:
-            st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-            st.markdown("*Optional Coordinates*")
-            col_lat, col_lon = st.columns(2)
-            with col_lat:
-                lat_input = st.text_input("Latitude", key="trip_lat")
-            with col_lon:
-                lon_input = st.text_input("Longitude", key="trip_lon")
-            st.markdown('</div>', unsafe_allow_html=True)
+            with tv_card():
+                st.markdown("*Optional Coordinates*")
+                col_lat, col_lon = st.columns(2)
+                with col_lat:
+                    lat_input = st.text_input("Latitude", key="trip_lat")
+                with col_lon:
+                    lon_input = st.text_input("Longitude", key="trip_lon")
 
     if st.button("💾 Save Trip"):
         if destination:
@@ -587,10 +861,9 @@ elif st.session_state.logged_in and menu == "Trip Planner":
                 "lon": lon_val
             }
             user_trips.append(new_trip)
-            trips[username] = user_trips
-            save_trips(trips)
+            save_user_trips(username, user_trips)
             st.success(f"Trip to {destination} saved!")
-            trigger_reminders(username, trips)
+            trigger_reminders(user_trips)
             st.rerun()
         else:
             st.warning("Please enter a destination.")
@@ -598,15 +871,9 @@ elif st.session_state.logged_in and menu == "Trip Planner":
     # Display Trips
     if user_trips:
         st.subheader("📋 Your Trips")
-        df = pd.DataFrame([{
-            "Destination": t["destination"],
-            "Start Date": t["start_date"],
-            "End Date": t["end_date"],
-            "Notes": t["notes"]
-        } for t in user_trips])
-        st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-        st.dataframe(df, use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        df = _trips_table(username, len(user_trips), _mtime(_user_trips_path(username)), user_trips)
+        with tv_card():
+            st.dataframe(df, use_container_width=True)
 
         badge_name, _, next_threshold = get_user_badge(len(user_trips))
         st.markdown(
@@ -614,169 +881,32 @@ elif st.session_state.logged_in and menu == "Trip Planner":
             + (f" • *Next in:* {max(0, next_threshold-len(user_trips))} trip(s)" if next_threshold is not None else " • *Max badge achieved!*")
         )
 
-        trigger_reminders(username, trips)
-
-        for i, trip in enumerate(user_trips):
-            st.markdown("---")
-            top1, top2, top3 = st.columns([5,2,1])
-            with top1:
-                st.markdown(f"### ✈ {trip['destination']}  \n`{trip['start_date']} → {trip['end_date']}`")
-            with top2:
-                d = parse_date_str(trip.get("start_date",""))
-                if d:
-                    days_left = (d - date.today()).days
-                    if days_left >= 0:
-                        st.caption(f"⏳ Starts in *{days_left}* day(s)")
-                    else:
-                        st.caption("✅ Trip started/finished")
-            with top3:
-                if st.button("🗑 Delete Trip", key=f"del_trip_{i}"):
-                    user_trips.pop(i)
-                    trips[username] = user_trips
-                    save_trips(trips)
-                    st.rerun()
+        trigger_reminders(user_trips)
 
-            # Checklist
-            with st.expander(f"✅ Travel Checklist — {trip['destination']}"):
-                ci1, ci2 = st.columns([4,1])
-                with ci1:
-                    new_item_text = st.text_input("Add checklist item", key=f"chk_add_{i}")
-                with ci2:
-                    if st.button("Add", key=f"chk_btn_{i}"):
-                        if new_item_text.strip():
-                            trip["checklist"].append({"text": new_item_text.strip(), "done": False})
-                            trips[username] = user_trips
-                            save_trips(trips)
-                            st.rerun()
-                        else:
-                            st.warning("Please type an item first.")
-
-                if trip["checklist"]:
-                    for j, item in enumerate(trip["checklist"]):
-                        colX, colY, colZ = st.columns([6, 2, 1])
-                        with colX:
-                            new_done = st.checkbox(item["text"], value=item.get("done", False), key=f"chk_item_{i}_{j}")
-                            if new_done != item.get("done", False):
-                                item["done"] = new_done
-                                trips[username] = user_trips
-                                save_trips(trips)
-                        with colY:
-                            edited = st.text_input("Update item text", value=item["text"], key=f"edit_text_{i}_{j}")
-                            if st.button("Save", key=f"save_text_{i}_{j}"):
-                                item["text"] = edited.strip() or item["text"]
-                                trips[username] = user_trips
-                                save_trips(trips)
-                                st.success("Item updated.")
-                                st.rerun()
-                        with colZ:
-                            if st.button("🗑", key=f"del_chk_{i}_{j}"):
-                                trip["checklist"].pop(j)
-                                trips[username] = user_trips
-                                save_trips(trips)
-                                st.rerun()
-                else:
-                    st.info("No checklist items yet. Add one above.")
-
-            # Expenses management
-            with st.expander(f"💰 Manage Expenses — {trip['destination']}"):
-                category = st.selectbox("Category", ["Flights", "Hotels", "Food", "Activities", "Misc"], key=f"cat_{i}")
-                desc = st.text_input("Description", key=f"desc_{i}")
-                amount = st.number_input("Amount", min_value=0.0, step=0.01, key=f"amt_{i}")
-                if st.button("Add Expense", key=f"add_exp_{i}"):
-                    if desc and amount > 0:
-                        trip["expenses"].append({
-                            "category": category,
-                            "description": desc,
-                            "amount": amount
-                        })
-                        trips[username] = user_trips
-                        save_trips(trips)
-                        st.rerun()
-                    else:
-                        st.warning("Enter a description and amount.")
-
-                if trip["expenses"]:
-                    exp_df = pd.DataFrame(trip["expenses"])
-                    st.dataframe(exp_df, use_container_width=True)
-                    for j, exp in enumerate(trip["expenses"]):
-                        colA, colB, colC = st.columns([2,2,1])
-                        with colA:
-                            st.write(f"{exp['category']}** - {exp['description']}")
-                        with colB:
-                            st.write(f"${exp['amount']:.2f}")
-                        with colC:
-                            if st.button("✏ Edit", key=f"edit_exp_{i}_{j}"):
-                                new_cat = st.selectbox(
-                                    "Edit Category",
-                                    ["Flights", "Hotels", "Food", "Activities", "Misc"],
-                                    index=["Flights", "Hotels", "Food", "Activities", "Misc"].index(exp["category"]),
-                                    key=f"new_cat_{i}_{j}"
-                                )
-                                new_desc = st.text_input("Edit Description", value=exp["description"], key=f"new_desc_{i}_{j}")
-                                new_amt = st.number_input("Edit Amount", min_value=0.0, step=0.01, value=exp["amount"], key=f"new_amt_{i}_{j}")
-                                if st.button("Save Changes", key=f"save_edit_{i}_{j}"):
-                                    exp["category"] = new_cat
-                                    exp["description"] = new_desc
-                                    exp["amount"] = new_amt
-                                    trips[username] = user_trips
-                                    save_trips(trips)
-                                    st.success("Expense updated!")
-                                    st.rerun()
-                            if st.button("🗑 Delete", key=f"del_exp_{i}_{j}"):
-                                trip["expenses"].pop(j)
-                                trips[username] = user_trips
-                                save_trips(trips)
-                                st.rerun()
+        for i in range(len(user_trips)):
+            render_trip(username, user_trips, i)
     else:
         st.info("No trips planned yet. Add one above.")
 
 # ---------------------- MAP (menu) ----------------------
-elif st.session_state.logged_in and menu == "Map":
+def render_map():
     st.header("🗺 Interactive Map - Your Visits")
     username = st.session_state.username
-    user_trips = trips.get(username, [])
-
-    map_rows = []
-    for t in user_trips:
-        dest = t.get("destination","")
-        lat = t.get("lat")
-        lon = t.get("lon")
-        if lat is None or lon is None:
-            coords = fallback_coords_for_destination(dest)
-            if coords:
-                lat, lon = coords
-        try:
-            lat_f = float(lat) if lat is not None else None
-            lon_f = float(lon) if lon is not None else None
-        except Exception:
-            lat_f, lon_f = None, None
-        if lat_f is not None and lon_f is not None:
-            map_rows.append({"destination": dest, "lat": lat_f, "lon": lon_f, "start_date": t.get("start_date","")})
-
-    if map_rows:
-        map_df = pd.DataFrame(map_rows)
-        layer = pdk.Layer(
-            "ScatterplotLayer",
-            data=map_df,
-            get_position=["lon", "lat"],
-            get_fill_color=[40, 160, 255],
-            get_radius=50000,
-            radius_scale=20,
-            pickable=True
-        )
-        center = [map_df["lon"].mean(), map_df["lat"].mean()]
-        view_state = pdk.ViewState(latitude=center[1], longitude=center[0], zoom=1.5, pitch=0)
-        deck = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip={"text":"{destination}\n{start_date}"})
-        st.pydeck_chart(deck)
+    user_trips = get_user_trips(username)
+
+    map_df = build_map_df(user_trips)
+    if not map_df.empty:
+        st.pydeck_chart(cached_deck(map_df, [40, 160, 255]))
     else:
         st.info("No geocoded trips to show. Add lat/lon when creating a trip or use a common destination name.")
 
 # ---------------------- EDIT PROFILE ----------------------
-elif st.session_state.logged_in and menu == "Edit Profile":
+def render_edit_profile():
     username = st.session_state.username
-    profile_img_path = users[username].get('profile_pic')
+    u = users[username]
+    profile_img_path = u.get('profile_pic')
 
-    user_trips = trips.get(username, [])
+    user_trips = get_user_trips(username)
     badge_name, _, next_threshold = get_user_badge(len(user_trips))
     display_profile_card(username, profile_img_path, badge_name)
 
@@ -784,96 +914,124 @@ elif st.session_state.logged_in and menu == "Edit Profile":
     col1, col2 = st.columns([1,2])
 
     with col1:
-        st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-        new_profile_image = st.file_uploader("Upload New Profile Picture", type=["png", "jpg", "jpeg"])
-        if st.button("Update Profile Picture"):
-            if new_profile_image:
-                img_filename = f"profile_pics/{username}.png"
-                Image.open(new_profile_image).save(img_filename)
-                users[username]['profile_pic'] = img_filename
-                save_users(users)
-                st.success("Profile Picture Updated!")
-                st.rerun()
-            else:
-                st.warning("Please upload an image.")
-        st.markdown('</div>', unsafe_allow_html=True)
+        with tv_card():
+            new_profile_image = st.file_uploader("Upload New Profile Picture", type=["png", "jpg", "jpeg"])
+            if st.button("Update Profile Picture"):
+                if new_profile_image:
+                    old_pic = u.get('profile_pic')
+                    u['profile_pic'] = save_profile_pic(new_profile_image, username)
+                    save_users(users)
+                    # Pictures saved before the WebP switch live at a different path
+                    if old_pic and old_pic != u['profile_pic']:
+                        try:
+                            os.remove(old_pic)
+                        except OSError:
+                            pass
+                    st.success("Profile Picture Updated!")
+                    st.rerun()
+                else:
+                    st.warning("Please upload an image.")
 
     with col2:
-        st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-        st.markdown("#### 🧭 Profile Customization")
-        bio = st.text_area("Bio", value=users[username].get("bio", ""), placeholder="Tell us about your travel style...")
-        fav_dest = st.text_input("Favorite Destination", value=users[username].get("favorite_destination", ""), placeholder="e.g., Kyoto, Santorini, Banff")
-        goals = st.text_area("Travel Goals", value=users[username].get("goals", ""), placeholder="e.g., Visit 3 new countries this year")
-
-        if st.button("💾 Save Profile"):
-            users[username]["bio"] = bio.strip()
-            users[username]["favorite_destination"] = fav_dest.strip()
-            users[username]["goals"] = goals.strip()
-            save_users(users)
-            st.success("Profile details saved!")
-
-        st.markdown("#### 🏅 Your Travel Badge")
-        st.markdown(f"*Current Badge:* {badge_name}")
-        st.markdown(f"*Trips Logged:* {len(user_trips)}")
-        if next_threshold is not None:
-            remaining = max(0, next_threshold - len(user_trips))
-            st.progress(0 if next_threshold == 0 else min(1.0, len(user_trips) / max(1, next_threshold)))
-            st.caption(f"{remaining} more trip(s) to reach the next badge.")
-        else:
-            st.caption("You’ve reached the top badge — World Citizen! 🎉")
-        st.markdown('</div>', unsafe_allow_html=True)
+        with tv_card():
+            st.markdown("#### 🧭 Profile Customization")
+            bio = st.text_area("Bio", value=u.get("bio", ""), placeholder="Tell us about your travel style...")
+            fav_dest = st.text_input("Favorite Destination", value=u.get("favorite_destination", ""), placeholder="e.g., Kyoto, Santorini, Banff")
+            goals = st.text_area("Travel Goals", value=u.get("goals", ""), placeholder="e.g., Visit 3 new countries this year")
+
+            if st.button("💾 Save Profile"):
+                u["bio"] = bio.strip()
+                u["favorite_destination"] = fav_dest.strip()
+                u["goals"] = goals.strip()
+                save_users(users)
+                st.success("Profile details saved!")
+
+            st.markdown("#### 🏅 Your Travel Badge")
+            st.markdown(f"*Current Badge:* {badge_name}")
+            st.markdown(f"*Trips Logged:* {len(user_trips)}")
+            if next_threshold is not None:
+                remaining = max(0, next_threshold - len(user_trips))
+                st.progress(0 if next_threshold == 0 else min(1.0, len(user_trips) / max(1, next_threshold)))
+                st.caption(f"{remaining} more trip(s) to reach the next badge.")
+            else:
+                st.caption("You’ve reached the top badge — World Citizen! 🎉")
 
 # ---------------------- SETTINGS ----------------------
-elif st.session_state.logged_in and menu == "Settings":
+def render_settings():
     st.header("⚙ Settings")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    new_pass = st.text_input("New Password", type="password")
-    if st.button("Update Password"):
-        if new_pass:
-            users[st.session_state.username]['password'] = hash_password(new_pass)
-            save_users(users)
-            st.success("Password updated successfully!")
-    st.markdown('</div>', unsafe_allow_html=True)
+    with tv_card():
+        new_pass = st.text_input("New Password", type="password")
+        if st.button("Update Password"):
+            if new_pass:
+                users[st.session_state.username]['password'] = hash_password(new_pass)
+                save_users(users)
+                st.success("Password updated successfully!")
 
 # ---------------------- CONTACT ----------------------
-elif st.session_state.logged_in and menu == "Contact":
+def render_contact():
     st.header("📞 Contact Us")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    st.write("For any queries, reach us at: support@travelviz.com")
-    st.markdown('</div>', unsafe_allow_html=True)
+    with tv_card():
+        st.write("For any queries, reach us at: support@travelviz.com")
 
 # ---------------------- CHATBOT ----------------------
-elif st.session_state.logged_in and menu == "Chatbot":
+def render_chatbot():
     st.header("🤖 TravelViz Chatbot")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    user_message = st.text_input("Ask me about the project:")
-    if st.button("Send"):
-        if user_message:
-            bot_reply = chatbot_response(user_message)
-            st.text_area("Bot:", value=bot_reply, height=100)
-    st.markdown('</div>', unsafe_allow_html=True)
+    with tv_card():
+        user_message = st.text_input("Ask me about the project:")
+        if st.button("Send"):
+            if user_message:
+                bot_reply = chatbot_response(user_message)
+                st.text_area("Bot:", value=bot_reply, height=100)
 
 # ---------------------- ADMIN PANEL ----------------------
-elif st.session_state.logged_in and menu == "Admin Panel" and st.session_state.role == "admin":
+def render_admin_panel():
     st.header("🛠 Admin Panel")
     st.subheader("Registered Users:")
-    st.markdown('<div class="tv-card">', unsafe_allow_html=True)
-    for user in users:
-        col1, col2, col3 = st.columns([2,1,1])
+    with tv_card():
+        st.dataframe(_admin_table(_mtime(USERS_FILE), _mtime(TRIPS_DIR)), use_container_width=True, hide_index=True)
+        user = st.selectbox("Target user", list(users), key="admin_target")
+        info = users[user]
+        col1, col2 = st.columns(2)
         with col1:
-            st.write(f"👤 {user} ({users[user].get('role')})")
-        with col2:
-            if st.button(f"Switch as {user}", key=f"switch_{user}"):
+            if st.button(f"Switch as {user}", key="admin_switch"):
                 st.session_state.username = user
-                st.session_state.role = users[user].get("role", "user")
+                st.session_state.role = info.get("role", "user")
                 st.rerun()
-        with col3:
-            if st.button(f"Reset Pic {user}", key=f"reset_{user}"):
-                users[user]['profile_pic'] = None
+        with col2:
+            if st.button(f"Reset Pic {user}", key="admin_reset_pic"):
+                info['profile_pic'] = None
                 save_users(users)
                 st.success(f"Profile picture reset for {user}")
                 st.rerun()
-    st.markdown('</div>', unsafe_allow_html=True)
+
+# ---------------------- Dispatch ----------------------
+PUBLIC_PAGES = {
+    "Login": render_login,
+    "Sign Up": render_sign_up,
+}
+PAGES = {
+    "Home": render_home,
+    "Dashboard": render_dashboard,
+    "Insights": render_insights,
+    "Trip Planner": render_trip_planner,
+    "Map": render_map,
+    "Edit Profile": render_edit_profile,
+    "Settings": render_settings,
+    "Contact": render_contact,
+    "Chatbot": render_chatbot,
+}
+ADMIN_PAGES = {
+    "Admin Panel": render_admin_panel,
+}
+
+if not st.session_state.logged_in:
+    page = PUBLIC_PAGES.get(menu)
+elif st.session_state.role == "admin":
+    page = PAGES.get(menu) or ADMIN_PAGES.get(menu)
+else:
+    page = PAGES.get(menu)
+if page:
+    page()
 
 # ---------------------- Footer ----------------------
 st.markdown("""